@@ -4,7 +4,6 @@ import requests
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from timezonefinder import TimezoneFinder
-import xml.etree.ElementTree as ET
 import os
 import json
 from flask import Flask
@@ -12,6 +11,10 @@ import threading
 from PIL import Image, ImageDraw, ImageFont
 import io
 import base64
+from utils.user_registry import UserRegistry
+from utils.cap_parser import parse_cap_entries
+from utils.alert_geometry import match_alerts, backfill_ugc
+from utils.alert_tracker import ActiveAlerts
 
 # --- Environment Variables ---
 TOKEN = os.getenv("TOKEN")
@@ -28,36 +31,56 @@ intents.members = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
 # --- Globals ---
-user_zips = {}
+user_zips = UserRegistry()
 sales_data = {}
 inventory_data = {}
 registered_mods = set()
-posted_alerts = {}
+posted_alerts = ActiveAlerts()
 quiet_until = None
 tf = TimezoneFinder()
 DATA_FILE = "lumina_data.json"
+unloaded_user_zips = None
 
 # --- Load persistent data ---
 if os.path.exists(DATA_FILE):
     try:
         with open(DATA_FILE, "r") as f:
             data = json.load(f)
-            user_zips = data.get("user_zips", {})
             sales_data = data.get("sales_data", {})
             inventory_data = data.get("inventory_data", {})
             registered_mods = set(data.get("registered_mods", []))
+            try:
+                user_zips = UserRegistry.from_json(data.get("user_zips", {}),
+                                                   tz_lookup=lambda lat, lon: tf.timezone_at(lat=lat, lng=lon))
+            except Exception as e:
+                print(f"Could not load user_zips: {e}")
+                # Keep the saved registrations so save_data() doesn't overwrite them
+                unloaded_user_zips = data.get("user_zips")
     except:
         pass
 
+# Shared with cogs (the Weather cog registers ZIPs into this registry and
+# answers `!weather` from the alert table weather_loop maintains)
+bot.user_zips = user_zips
+bot.active_alerts = posted_alerts
+ugc_retry_at = {}
+
 def save_data():
+    zips = user_zips.to_json()
+    if isinstance(unloaded_user_zips, dict):
+        zips = {**unloaded_user_zips, **zips}
+    elif unloaded_user_zips is not None:
+        zips = unloaded_user_zips
     with open(DATA_FILE, "w") as f:
         json.dump({
-            "user_zips": user_zips,
+            "user_zips": zips,
             "sales_data": sales_data,
             "inventory_data": inventory_data,
             "registered_mods": list(registered_mods)
         }, f)
 
+bot.save_data = save_data
+
 # --- Safety Advice ---
 SAFETY_ADVICE = {
     "Tornado Warning": "🌪️ Take shelter immediately in a basement or interior room on the lowest floor, away from windows.",
@@ -115,41 +138,77 @@ async def fetch_weather_alerts():
         try:
             res = requests.get(feed)
             if res.status_code == 200:
-                root = ET.fromstring(res.content)
-                for entry in root.findall("{http://www.w3.org/2005/Atom}entry"):
-                    title = entry.find("{http://www.w3.org/2005/Atom}title").text
-                    cap_event = entry.find("{urn:oasis:names:tc:emergency:cap:1.1}event")
-                    cap_area = entry.find("{urn:oasis:names:tc:emergency:cap:1.1}areaDesc")
-                    cap_sent = entry.find("{urn:oasis:names:tc:emergency:cap:1.1}sent")
-                    if cap_event is not None and cap_area is not None and cap_sent is not None:
-                        alerts_to_post[title] = {
-                            "area": cap_area.text,
-                            "sent": cap_sent.text
-                        }
+                for entry in parse_cap_entries(res.content):
+                    if entry["event"] and entry["area"] and entry["sent"]:
+                        alerts_to_post[entry["identifier"]] = entry
         except:
             pass
     return alerts_to_post
 
+def mentions(uids):
+    return " ".join(f"<@{uid}>" for uid in uids)
+
+def format_alert(info, uids):
+    safety = SAFETY_ADVICE.get(info["event"], "")
+    msg = f"⚠️ **{info['title']}** in {info['area']} (Sent {info['sent']})\n"
+    return msg + mentions(uids) + "\n" + safety
+
+async def send_alert(channel, content):
+    if channel is None:
+        return None
+    try:
+        return await channel.send(content)
+    except discord.HTTPException as e:
+        print(f"Could not post weather alert: {e}")
+        return None
+
+async def close_alert(record, reason):
+    if record["message"]:
+        info = record["entry"]
+        try:
+            await record["message"].edit(content=f"✅ ~~{info['title']}~~ in {info['area']} {reason}.")
+        except discord.HTTPException:
+            pass
+
 async def post_weather_alerts():
     alerts = await fetch_weather_alerts()
+    # An empty result usually means the fetch failed; keep the seen set until the next good fetch.
+    if alerts:
+        posted_alerts.prune_seen(alerts)
     channel = bot.get_channel(CHANNEL_ID)
-    for title, info in alerts.items():
-        if title in posted_alerts:
-            continue
-        affected_users = []
-        for uid, zipinfo in user_zips.items():
-            coords = zip_to_coords(zipinfo["zip"])
-            if coords:
-                affected_users.append(f"<@{uid}>")
-        if affected_users:
-            safety = SAFETY_ADVICE.get(title, "")
-            msg = f"⚠️ **{title}** in {info['area']} (Sent {info['sent']})\n"
-            msg += " ".join(affected_users) + "\n" + safety
-            await channel.send(msg)
-            posted_alerts[title] = True
+    new_alerts = {ident: info for ident, info in alerts.items() if posted_alerts.is_new(info)}
+    recipients = match_alerts(new_alerts, user_zips)
+    for ident, info in new_alerts.items():
+        previous = posted_alerts.lookup(info)
+        old_uids = set(previous["uids"]) if previous else set()
+        action, record = posted_alerts.apply(info, recipients[ident])
+        if action == "cancel":
+            await close_alert(record, "was cancelled")
+        elif action == "expired":
+            await close_alert(record, "has expired")
+        elif action == "update" and record["message"]:
+            try:
+                await record["message"].edit(content=format_alert(info, record["uids"]))
+            except discord.HTTPException:
+                # Deleted or uneditable; the pass below posts it again.
+                record["message"] = None
+                continue
+            # Edits don't ping newly added mentions, so tell users the update pulled in.
+            added = [uid for uid in record["uids"] if uid not in old_uids]
+            if added:
+                await send_alert(channel, f"⚠️ **{info['title']}** now includes your area.\n" + mentions(added))
+    # Expire first so nothing already over gets posted below.
+    for record in posted_alerts.expire():
+        await close_alert(record, "has expired")
+    # Post anything not yet on the channel, including sends that failed on an earlier cycle.
+    for record in list(posted_alerts.alerts.values()):
+        if record["message"] is None and record["uids"]:
+            record["message"] = await send_alert(channel, format_alert(record["entry"], record["uids"]))
 
 @tasks.loop(minutes=2)
 async def weather_loop():
+    if await backfill_ugc(user_zips, ugc_retry_at):
+        save_data()
     await post_weather_alerts()
 
 # --- Inspirational Quote ---
@@ -341,6 +400,11 @@ def run_flask():
     app.run(host='0.0.0.0', port=6969)
 threading.Thread(target=run_flask).start()
 
+# --- Cogs ---
+@bot.event
+async def setup_hook():
+    await bot.load_extension("cogs.weather")
+
 # --- Bot ready ---
 @bot.event
 async def on_ready():
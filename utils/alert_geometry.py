@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import numpy as np
+import requests
+
+UGC_LOOKUP_TIMEOUT = 10  # seconds
+
+# State FIPS code -> postal abbreviation, for turning CAP FIPS6 codes into county UGC codes.
+STATE_FIPS = {
+    "01": "AL", "02": "AK", "04": "AZ", "05": "AR", "06": "CA", "08": "CO", "09": "CT",
+    "10": "DE", "11": "DC", "12": "FL", "13": "GA", "15": "HI", "16": "ID", "17": "IL",
+    "18": "IN", "19": "IA", "20": "KS", "21": "KY", "22": "LA", "23": "ME", "24": "MD",
+    "25": "MA", "26": "MI", "27": "MN", "28": "MS", "29": "MO", "30": "MT", "31": "NE",
+    "32": "NV", "33": "NH", "34": "NJ", "35": "NM", "36": "NY", "37": "NC", "38": "ND",
+    "39": "OH", "40": "OK", "41": "OR", "42": "PA", "44": "RI", "45": "SC", "46": "SD",
+    "47": "TN", "48": "TX", "49": "UT", "50": "VT", "51": "VA", "53": "WA", "54": "WV",
+    "55": "WI", "56": "WY", "60": "AS", "66": "GU", "69": "MP", "72": "PR", "78": "VI",
+}
+
+def parse_polygon(text):
+    """Parse a CAP polygon ("lat,lon lat,lon ...") into an (n, 2) array, or None."""
+    if not text:
+        return None
+    try:
+        points = np.array([pair.split(",") for pair in text.split()], dtype=np.float64)
+    except ValueError:
+        return None
+    if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+        return None
+    return points
+
+def fips_to_ugc(fips6):
+    """Convert a CAP FIPS6 code (e.g. 048113) to a county UGC code (e.g. TXC113)."""
+    state = STATE_FIPS.get(fips6[1:3])
+    if len(fips6) != 6 or not state:
+        return None
+    return f"{state}C{fips6[3:]}"
+
+def coords_to_ugc(lat, lon):
+    """Look up the NWS forecast zone and county UGC codes for a point."""
+    try:
+        res = requests.get(f"https://api.weather.gov/points/{lat:.4f},{lon:.4f}",
+                           headers={"User-Agent": "LuminaBot"}, timeout=UGC_LOOKUP_TIMEOUT)
+        if res.status_code == 200:
+            props = res.json()["properties"]
+            zone = props.get("forecastZone", "").rstrip("/").split("/")[-1] or None
+            county = props.get("county", "").rstrip("/").split("/")[-1] or None
+            return zone, county
+    except:
+        pass
+    return None, None
+
+async def backfill_ugc(registry, retry_at, limit=25, retry_delay=3600):
+    """Look up UGC codes for users registered without them (old data or failed lookups).
+
+    At most ``limit`` lookups run per call. Each HTTP request runs in a worker
+    thread; the registry itself is only touched on the event loop. ``retry_at``
+    maps uid -> monotonic time before which a failed lookup isn't retried; the
+    caller keeps it between calls. Returns the number of users filled in.
+    """
+    filled = lookups = 0
+    for uid in registry.missing_ugc().tolist():
+        if lookups >= limit:
+            break
+        if retry_at.get(uid, 0) > time.monotonic():
+            continue
+        lookups += 1
+        info = registry.get(uid)
+        zone, county = await asyncio.to_thread(coords_to_ugc, info["lat"], info["lon"])
+        # The user may have re-registered while the lookup was running.
+        current = registry.get(uid)
+        if current is None or (current["lat"], current["lon"]) != (info["lat"], info["lon"]):
+            continue
+        if zone or county:
+            registry.set_ugc(uid, zone, county)
+            retry_at.pop(uid, None)
+            filled += 1
+        else:
+            retry_at[uid] = time.monotonic() + retry_delay
+            print(f"No UGC codes for user {uid}; zone-based alerts won't reach them until a lookup succeeds")
+    return filled
+
+def points_in_polygon(polygon, lats, lons):
+    """Ray-casting test of many points against one polygon. Returns a bool mask."""
+    inside = np.zeros(len(lats), dtype=bool)
+    lat_j, lon_j = polygon[-1]
+    for lat_i, lon_i in polygon:
+        crosses = (lat_i > lats) != (lat_j > lats)
+        if crosses.any():
+            with np.errstate(divide="ignore", invalid="ignore"):
+                lon_cross = (lon_j - lon_i) * (lats - lat_i) / (lat_j - lat_i) + lon_i
+            inside ^= crosses & (lons < lon_cross)
+        lat_j, lon_j = lat_i, lon_i
+    return inside
+
+def match_alerts(alerts, registry):
+    """Work out which registered users each alert covers.
+
+    ``alerts`` maps an alert key to a parsed CAP entry (see utils.cap_parser).
+    Alerts with a polygon are matched by bounding box then ray casting; alerts
+    without one fall back to the users' UGC zone/county. Returns
+    {alert key: int64 array of uids}.
+    """
+    uids, lats, lons = registry.coordinates()
+    zones = registry.column("zone")
+    counties = registry.column("county")
+    # Sorting by latitude once lets each bounding box become a searchsorted slice.
+    order = np.argsort(lats, kind="stable")
+    sorted_lats = lats[order]
+
+    recipients = {}
+    for key, alert in alerts.items():
+        polygon = parse_polygon(alert.get("polygon"))
+        if polygon is not None:
+            (min_lat, min_lon), (max_lat, max_lon) = polygon.min(axis=0), polygon.max(axis=0)
+            lo = np.searchsorted(sorted_lats, min_lat, side="left")
+            hi = np.searchsorted(sorted_lats, max_lat, side="right")
+            rows = order[lo:hi]
+            rows = rows[(lons[rows] >= min_lon) & (lons[rows] <= max_lon)]
+            rows = np.sort(rows[points_in_polygon(polygon, lats[rows], lons[rows])])
+        else:
+            codes = list(alert.get("ugc", []))
+            codes += [ugc for ugc in map(fips_to_ugc, alert.get("fips", [])) if ugc]
+            ids = registry.ugc_ids(codes)
+            rows = np.flatnonzero(np.isin(zones, ids) | np.isin(counties, ids))
+        recipients[key] = uids[rows]
+    return recipients
@@ -0,0 +1,145 @@
+import heapq
+from datetime import datetime, timezone
+
+def parse_cap_time(value):
+    """Parse a CAP timestamp into an aware datetime, or None."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+class ActiveAlerts:
+    """Active CAP alerts keyed by identifier, with an expiry min-heap.
+
+    Each alert is stored under the identifier of its first version. Update
+    messages are chained onto it through their references, so the record (and
+    whatever message was posted for it) carries over. Cancelled or updated
+    alerts leave stale heap entries behind; they are skipped when popped.
+    """
+
+    def __init__(self):
+        self.alerts = {}  # root identifier -> record
+        self._roots = {}  # identifier of any version -> root identifier
+        self._seen = set()
+        self._expiry = []  # (expires, root identifier)
+        self._by_user = {}  # uid -> set of root identifiers
+
+    def is_new(self, entry):
+        return entry["identifier"] not in self._seen
+
+    def lookup(self, entry):
+        """Return the active record an Update/Cancel entry refers to, or None."""
+        if (entry.get("msg_type") or "Alert").lower() == "alert":
+            return None
+        return self.alerts.get(self._root_of(entry))
+
+    def prune_seen(self, current):
+        """Forget identifiers that are neither in the current feed nor part of an active alert."""
+        self._seen.intersection_update(set(current) | self._roots.keys())
+
+    def apply(self, entry, uids=(), now=None):
+        """Record one parsed CAP entry (see utils.cap_parser).
+
+        Returns (action, record) where action is "new", "update", "cancel" or
+        "expired" (an update that arrived already past its expiry), or
+        (None, None) if the entry was already seen, had already expired, or
+        cancels an alert we never tracked.
+        """
+        ident = entry["identifier"]
+        if ident in self._seen:
+            return None, None
+        self._seen.add(ident)
+        root = self._root_of(entry)
+        msg_type = (entry.get("msg_type") or "Alert").lower()
+
+        if msg_type == "cancel":
+            if root is None:
+                return None, None
+            return "cancel", self.remove(root)
+
+        # An Update to an alert we already saw end (cancelled, expired or skipped)
+        # is not a new alert.
+        if root is None and msg_type == "update" and any(ref in self._seen for ref in entry.get("references", [])):
+            return None, None
+
+        expires = parse_cap_time(entry.get("expires"))
+        if expires and expires <= (now or datetime.now(timezone.utc)):
+            if root is None or msg_type == "alert":
+                return None, None
+            return "expired", self.remove(root)
+
+        if root is None or msg_type == "alert":
+            root = ident
+            record = self.alerts[root] = {"identifier": root, "versions": [ident], "uids": [], "message": None}
+            action = "new"
+        else:
+            record = self.alerts[root]
+            record["versions"].append(ident)
+            self._unindex(root, record["uids"])
+            action = "update"
+
+        self._roots[ident] = root
+        record["entry"] = entry
+        record["expires"] = expires
+        record["uids"] = [int(uid) for uid in uids]
+        for uid in record["uids"]:
+            self._by_user.setdefault(uid, set()).add(root)
+        if record["expires"]:
+            heapq.heappush(self._expiry, (record["expires"], root))
+        return action, record
+
+    def remove(self, root):
+        """Drop an alert and all its versions. Returns the removed record."""
+        record = self.alerts.pop(root, None)
+        if record is None:
+            return None
+        self._unindex(root, record["uids"])
+        for ident in record["versions"]:
+            self._roots.pop(ident, None)
+        return record
+
+    def expire(self, now=None):
+        """Pop every alert whose expiry has passed. Returns the removed records."""
+        now = now or datetime.now(timezone.utc)
+        expired = []
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, root = heapq.heappop(self._expiry)
+            record = self.alerts.get(root)
+            if record is not None and record["expires"] == expires:
+                expired.append(self.remove(root))
+        return expired
+
+    def reindex_user(self, uid, roots):
+        """Replace the alerts covering a user, e.g. after they register or change ZIP."""
+        uid = int(uid)
+        for root in self._by_user.pop(uid, ()):
+            record = self.alerts[root]
+            record["uids"] = [u for u in record["uids"] if u != uid]
+        roots = [root for root in roots if root in self.alerts]
+        for root in roots:
+            self.alerts[root]["uids"].append(uid)
+        if roots:
+            self._by_user[uid] = set(roots)
+
+    def for_user(self, uid, now=None):
+        """Return the alerts currently covering a user, soonest expiry first."""
+        now = now or datetime.now(timezone.utc)
+        records = [self.alerts[root] for root in self._by_user.get(int(uid), ())]
+        records = [r for r in records if r["expires"] is None or r["expires"] > now]
+        return sorted(records, key=lambda r: (r["expires"] is None, r["expires"] or now))
+
+    def _root_of(self, entry):
+        return next((self._roots[ref] for ref in entry.get("references", []) if ref in self._roots), None)
+
+    def _unindex(self, root, uids):
+        for uid in uids:
+            roots = self._by_user.get(uid)
+            if roots is not None:
+                roots.discard(root)
+                if not roots:
+                    del self._by_user[uid]
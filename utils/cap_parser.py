@@ -0,0 +1,72 @@
+import xml.etree.ElementTree as ET
+from urllib.parse import parse_qs, urlsplit
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+CAP = "{urn:oasis:names:tc:emergency:cap:1.1}"
+
+def _text(entry, tag):
+    elem = entry.find(tag)
+    if elem is None or elem.text is None:
+        return None
+    return elem.text.strip()
+
+def _geocodes(entry):
+    """Return {valueName: [values]} from an entry's cap:geocode block."""
+    codes = {}
+    geocode = entry.find(f"{CAP}geocode")
+    if geocode is None:
+        return codes
+    name = None
+    for child in geocode:
+        tag = child.tag.split("}")[-1]
+        if tag == "valueName":
+            name = (child.text or "").strip()
+        elif tag == "value" and name:
+            codes.setdefault(name, []).extend((child.text or "").split())
+    return codes
+
+def normalize_identifier(value):
+    """Reduce a CAP identifier or Atom <id> URL to the bare alert id.
+
+    The legacy feed uses ``...wwacapget.php?x=<id>`` links and
+    ``NOAA-NWS-ALERTS-<id>`` identifiers; api.weather.gov uses
+    ``.../alerts/<urn:oid:...>`` links and ``urn:oid:...`` identifiers.
+    """
+    if not value:
+        return value
+    value = value.strip()
+    if "://" in value:
+        parts = urlsplit(value)
+        query = parse_qs(parts.query)
+        value = query["x"][0] if "x" in query else parts.path.rstrip("/").rsplit("/", 1)[-1]
+    return value.removeprefix("NOAA-NWS-ALERTS-")
+
+def _references(entry):
+    """Return the identifiers from cap:references ("sender,identifier,sent ...")."""
+    text = _text(entry, f"{CAP}references")
+    if not text:
+        return []
+    return [normalize_identifier(ref.split(",")[1]) for ref in text.split() if ref.count(",") >= 2]
+
+def parse_cap_entries(content):
+    """Parse a NOAA CAP Atom feed into a list of alert dicts."""
+    root = ET.fromstring(content)
+    alerts = []
+    for entry in root.findall(f"{ATOM}entry"):
+        geocodes = _geocodes(entry)
+        alerts.append({
+            "id": _text(entry, f"{ATOM}id"),
+            "identifier": normalize_identifier(_text(entry, f"{CAP}identifier") or _text(entry, f"{ATOM}id")),
+            "title": _text(entry, f"{ATOM}title"),
+            "summary": _text(entry, f"{ATOM}summary"),
+            "event": _text(entry, f"{CAP}event"),
+            "area": _text(entry, f"{CAP}areaDesc"),
+            "sent": _text(entry, f"{CAP}sent"),
+            "expires": _text(entry, f"{CAP}expires"),
+            "msg_type": _text(entry, f"{CAP}msgType") or "Alert",
+            "references": _references(entry),
+            "polygon": _text(entry, f"{CAP}polygon"),
+            "ugc": geocodes.get("UGC", []),
+            "fips": geocodes.get("FIPS6", []),
+        })
+    return alerts
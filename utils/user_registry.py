@@ -0,0 +1,219 @@
+import numpy as np
+
+INITIAL_CAPACITY = 64
+UID_MIN, UID_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+# Don't bother compacting tiny tables; past this, compact once half the rows are tombstones.
+MIN_COMPACT_ROWS = 256
+
+# column name -> (dtype, fill value for empty rows)
+COLUMNS = {
+    "uid": (np.int64, 0),
+    "lat": (np.float64, np.nan),
+    "lon": (np.float64, np.nan),
+    "zip": (np.int32, -1),
+    "tz": (np.int32, -1),
+    "zone": (np.int32, -1),
+    "county": (np.int32, -1),
+    "alive": (np.bool_, False),
+}
+
+
+class UserRegistry:
+    """Registered users' locations stored as parallel NumPy columns.
+
+    Each user is one row: uid (int64), lat, lon, an index into the ZIP code
+    table, an index into the timezone table and indexes into the UGC table
+    for the user's NWS forecast zone and county. A uid -> row dict gives O(1)
+    update and delete; deleted rows are tombstoned and reclaimed by compact().
+
+    Also behaves like the old ``user_zips`` dict (string uid keys mapping to
+    ``{"zip", "lat", "lon"}``) so existing callers keep working.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self._cols = {name: np.full(capacity, fill, dtype=dtype) for name, (dtype, fill) in COLUMNS.items()}
+        self._size = 0  # rows in use, including tombstones
+        self._dead = 0
+        self._rows = {}  # uid -> row
+        self.zip_codes = []
+        self._zip_ids = {}
+        self.tz_names = []
+        self._tz_ids = {}
+        self.ugc_codes = []
+        self._ugc_ids = {}
+        self.skipped = {}  # malformed JSON entries, written back untouched by to_json()
+
+    # --- Internals ---
+    @staticmethod
+    def _intern(table, ids, value):
+        if value is None:
+            return -1
+        idx = ids.get(value)
+        if idx is None:
+            idx = ids[value] = len(table)
+            table.append(value)
+        return idx
+
+    def _grow(self, capacity):
+        for name, (dtype, fill) in COLUMNS.items():
+            col = np.full(capacity, fill, dtype=dtype)
+            col[:self._size] = self._cols[name][:self._size]
+            self._cols[name] = col
+
+    def _new_row(self, uid):
+        if self._size == len(self._cols["uid"]):
+            self._grow(max(INITIAL_CAPACITY, self._size * 2))
+        row = self._size
+        self._size += 1
+        self._cols["uid"][row] = uid
+        self._cols["alive"][row] = True
+        self._rows[uid] = row
+        return row
+
+    # --- Updates ---
+    def update(self, uid, zip_code, lat, lon, tz=None, zone=None, county=None):
+        """Insert or overwrite a user's location. Returns the row index."""
+        uid, lat, lon = int(uid), float(lat), float(lon)
+        if not UID_MIN <= uid <= UID_MAX:
+            raise OverflowError(f"uid {uid} does not fit in int64")
+        row = self._rows.get(uid)
+        if row is None:
+            row = self._new_row(uid)
+        self._cols["lat"][row] = lat
+        self._cols["lon"][row] = lon
+        self._cols["zip"][row] = self._intern(self.zip_codes, self._zip_ids, zip_code)
+        self._cols["tz"][row] = self._intern(self.tz_names, self._tz_ids, tz)
+        self._cols["zone"][row] = self._intern(self.ugc_codes, self._ugc_ids, zone)
+        self._cols["county"][row] = self._intern(self.ugc_codes, self._ugc_ids, county)
+        return row
+
+    def set_ugc(self, uid, zone, county):
+        """Fill in a user's NWS zone/county UGC codes."""
+        row = self._rows[int(uid)]
+        self._cols["zone"][row] = self._intern(self.ugc_codes, self._ugc_ids, zone)
+        self._cols["county"][row] = self._intern(self.ugc_codes, self._ugc_ids, county)
+
+    def delete(self, uid):
+        """Tombstone a user's row. Returns False if the user wasn't registered."""
+        row = self._rows.pop(int(uid), None)
+        if row is None:
+            return False
+        self._cols["alive"][row] = False
+        self._dead += 1
+        if self._size >= MIN_COMPACT_ROWS and self._dead * 2 >= self._size:
+            self.compact()
+        return True
+
+    def compact(self):
+        """Drop tombstoned rows and rebuild the uid -> row index."""
+        keep = np.flatnonzero(self._cols["alive"][:self._size])
+        capacity = max(INITIAL_CAPACITY, len(keep) * 2)
+        for name, (dtype, fill) in COLUMNS.items():
+            col = np.full(capacity, fill, dtype=dtype)
+            col[:len(keep)] = self._cols[name][keep]
+            self._cols[name] = col
+        self._size = len(keep)
+        self._dead = 0
+        self._rows = dict(zip(self._cols["uid"][:self._size].tolist(), range(self._size)))
+
+    # --- Bulk export ---
+    def coordinates(self):
+        """Return (uids, lats, lons) arrays for every live user."""
+        alive = self._cols["alive"][:self._size]
+        return (
+            self._cols["uid"][:self._size][alive],
+            self._cols["lat"][:self._size][alive],
+            self._cols["lon"][:self._size][alive],
+        )
+
+    def column(self, name):
+        """Return a copy of one column (see COLUMNS) restricted to live users."""
+        alive = self._cols["alive"][:self._size]
+        return self._cols[name][:self._size][alive]
+
+    def missing_ugc(self):
+        """Return the uids of live users with neither a zone nor a county UGC code."""
+        live = self._cols["alive"][:self._size]
+        missing = live & (self._cols["zone"][:self._size] < 0) & (self._cols["county"][:self._size] < 0)
+        return self._cols["uid"][:self._size][missing]
+
+    def ugc_ids(self, codes):
+        """Map UGC codes to their ids in the zone/county columns, skipping unknown codes."""
+        return np.array([self._ugc_ids[c] for c in codes if c in self._ugc_ids], dtype=np.int32)
+
+    # --- Dict-style access (old user_zips format) ---
+    def _info(self, row):
+        info = {
+            "zip": self.zip_codes[self._cols["zip"][row]] if self._cols["zip"][row] >= 0 else None,
+            "lat": float(self._cols["lat"][row]),
+            "lon": float(self._cols["lon"][row]),
+        }
+        tz = self._cols["tz"][row]
+        if tz >= 0:
+            info["tz"] = self.tz_names[tz]
+        for key in ("zone", "county"):
+            if self._cols[key][row] >= 0:
+                info[key] = self.ugc_codes[self._cols[key][row]]
+        return info
+
+    def get(self, uid, default=None):
+        row = self._rows.get(int(uid))
+        if row is None:
+            return default
+        return self._info(row)
+
+    def __getitem__(self, uid):
+        info = self.get(uid)
+        if info is None:
+            raise KeyError(uid)
+        return info
+
+    def __setitem__(self, uid, info):
+        self.update(uid, info.get("zip"), info["lat"], info["lon"], info.get("tz"),
+                    info.get("zone"), info.get("county"))
+
+    def __delitem__(self, uid):
+        if not self.delete(uid):
+            raise KeyError(uid)
+
+    def __contains__(self, uid):
+        try:
+            return int(uid) in self._rows
+        except (TypeError, ValueError):
+            return False
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return (str(uid) for uid in list(self._rows))
+
+    def items(self):
+        for uid, row in list(self._rows.items()):
+            yield str(uid), self._info(row)
+
+    # --- JSON persistence ---
+    def to_json(self):
+        """Export in the ``user_zips`` JSON shape: {uid: {"zip", "lat", "lon", ...}}."""
+        return {**self.skipped, **dict(self.items())}
+
+    @classmethod
+    def from_json(cls, data, tz_lookup=None):
+        """Build a registry from ``user_zips`` JSON.
+
+        ``tz_lookup(lat, lon)`` fills in the timezone for entries saved without
+        one (everything registered before the registry existed).
+        """
+        registry = cls(capacity=max(INITIAL_CAPACITY, len(data)))
+        for uid, info in data.items():
+            try:
+                if tz_lookup and not info.get("tz"):
+                    try:
+                        info = {**info, "tz": tz_lookup(float(info["lat"]), float(info["lon"]))}
+                    except ValueError:
+                        pass  # bad coordinates are reported by the insert below
+                registry[uid] = info
+            except (KeyError, TypeError, ValueError, AttributeError, OverflowError):
+                print(f"Skipping malformed user_zips entry for {uid!r}: {info!r}")
+                registry.skipped[uid] = info
+        return registry